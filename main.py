@@ -15,22 +15,43 @@
 - accepted_role_id: ID роли, выдаваемой пользователю при окончательном принятии
 - accept_message: текст ЛС при принятии
 - reject_message: текст ЛС при отказе
+- log_level: минимальный уровень логов, отправляемых в канал логов (INFO/WARNING/ERROR/CRITICAL)
+- ticket_message_id: ID уже развёрнутого сообщения с кнопкой (заполняется /deploy_ticket_message)
 """
 
-import json
+import asyncio
+import hashlib
 import os
+import re
+import sys
+import aiohttp
+import orjson
 import discord
 import logging
 from discord.ext import commands
 from discord import app_commands
+from dataclasses import dataclass
 from typing import Optional
 
+# uvloop (libuv) быстрее стандартного loop, но под Windows не собирается — там работаем без него
+uvloop = None
+if sys.platform != "win32":
+    try:
+        import uvloop
+    except ImportError:
+        pass
+
 # ---------------- CONFIG ----------------
 SETTINGS_FILE = "settings.json"
 EMBED_COLOR = 0x46009E  # фиолетовый #46009E
 TOKEN = os.getenv("DISCORD_TOKEN")
 # ----------------------------------------
 
+logger = logging.getLogger(__name__)
+
+# ID пользователя (snowflake) внутри упоминания или произвольного текста
+_SNOWFLAKE_RE = re.compile(r"\d{17,20}")
+
 # ----------------- SETTINGS IO -----------------
 
 def load_settings():
@@ -44,16 +65,68 @@ def load_settings():
             "accepted_role_id": None,
             "accept_message": "Ваш тикет был принят!",
             "reject_message": "Ваш тикет был отклонён.",
+            "log_level": "INFO",
         }
-        save_settings(default)
+        _write_settings_file(default)
         return default
-    with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(SETTINGS_FILE, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def _dump_settings(data: dict) -> bytes:
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+
+def _atomic_write(path: str, data: bytes):
+    # Пишем во временный файл и атомарно подменяем, чтобы не оставить битый JSON
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _write_settings_file(data: dict):
+    _atomic_write(SETTINGS_FILE, _dump_settings(data))
+
+
+# Изменения настроек копятся и пишутся на диск фоновой задачей `_settings_writer`
+# не чаще раза в SETTINGS_SAVE_DELAY секунд
+SETTINGS_SAVE_DELAY = 1.0
+_settings_dirty = asyncio.Event()
+_pending_settings: Optional[dict] = None
+_settings_writer_task: Optional[asyncio.Task] = None
 
 
 def save_settings(data: dict):
-    with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    """
+    Сохраняет настройки. Внутри event loop запись не выполняется сразу:
+    настройки помечаются изменёнными и пишутся на диск фоновой задачей `_settings_writer`.
+    Вне loop (при первом запуске / после остановки бота) пишет синхронно.
+    """
+    global _pending_settings
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        _write_settings_file(data)
+        return
+    _pending_settings = data
+    _settings_dirty.set()
+
+
+async def _settings_writer():
+    while True:
+        await _settings_dirty.wait()
+        # Ждём, чтобы несколько изменений подряд ушли одной записью
+        await asyncio.sleep(SETTINGS_SAVE_DELAY)
+        # Сбрасываем флаг до сериализации: изменения во время записи вызовут ещё одну
+        _settings_dirty.clear()
+        # Сериализуем в loop (настройки меняются только здесь), а блокирующие
+        # open/write/replace отдаём в пул потоков
+        data = _dump_settings(_pending_settings)
+        try:
+            await asyncio.to_thread(_atomic_write, SETTINGS_FILE, data)
+        except Exception:
+            logger.exception("Не удалось сохранить %s", SETTINGS_FILE)
 
 
 settings = load_settings()
@@ -71,6 +144,14 @@ def is_admin(interaction: discord.Interaction) -> bool:
     return interaction.user.guild_permissions.administrator
 
 
+async def send_ephemeral(interaction: discord.Interaction, message: str):
+    """Отвечает скрытым сообщением, учитывая, что ответ мог быть уже отложен (defer)."""
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+
 def str_to_int_maybe(s: str) -> Optional[int]:
     try:
         return int(s)
@@ -78,43 +159,231 @@ def str_to_int_maybe(s: str) -> Optional[int]:
         return None
 
 
+# Кэш ID-настроек: ключ настройки -> [int ID или None, найденный объект или None].
+# Сбрасывается в GenericValueModal.on_submit при изменении соответствующей настройки.
+_resolved: dict = {}
+
+
+def setting_id(key: str) -> Optional[int]:
+    """ID из настроек, приведённый к int (разбирается один раз до изменения настройки)."""
+    entry = _resolved.get(key)
+    if entry is None:
+        entry = _resolved[key] = [str_to_int_maybe(settings.get(key)), None]
+    return entry[0]
+
+
+def _resolve_setting(key: str, lookup):
+    obj_id = setting_id(key)
+    if obj_id is None:
+        return None
+    entry = _resolved[key]
+    if entry[1] is None:
+        entry[1] = lookup(obj_id)
+    return entry[1]
+
+
+def get_log_channel():
+    return _resolve_setting("log_channel_id", bot.get_channel)
+
+
+async def fetch_log_channel():
+    """Как get_log_channel, но если канала нет в кэше клиента — запрашивает его через API."""
+    ch = get_log_channel()
+    if ch is None:
+        channel_id = setting_id("log_channel_id")
+        if channel_id is None:
+            return None
+        entry = _resolved["log_channel_id"]
+        try:
+            ch = await bot.fetch_channel(channel_id)
+        except Exception:
+            return None
+        # Пока шёл запрос, log_channel_id могли поменять через /settings — тогда кэш не трогаем
+        if _resolved.get("log_channel_id") is entry:
+            entry[1] = ch
+    return ch
+
+
+def get_staff_role(guild: discord.Guild) -> Optional[discord.Role]:
+    return _resolve_setting("staff_role_id", guild.get_role)
+
+
+def get_accepted_role(guild: discord.Guild) -> Optional[discord.Role]:
+    return _resolve_setting("accepted_role_id", guild.get_role)
+
+
+def get_category(guild: discord.Guild):
+    return _resolve_setting("ticket_category_id", guild.get_channel)
+
+
+def forget_resolved(obj_id: int, *keys: str):
+    """Сбрасывает закэшированный объект для настроек `keys`, если он указывает на удалённый объект `obj_id`."""
+    for key in keys:
+        entry = _resolved.get(key)
+        if entry is not None and entry[0] == obj_id:
+            entry[1] = None
+
+
 # ----------------- LOGGING -> Discord channel -----------------
+# Все логи (embed'ы) складываются в очередь и отправляются в `log_channel_id`
+# одной фоновой задачей `_log_flusher` пачками, а не одним запросом на запись.
+_log_queue: asyncio.Queue = asyncio.Queue()
+_log_flusher_task: Optional[asyncio.Task] = None
+LOG_BATCH_WINDOW = 0.05     # сколько ждать дополнительные записи после первой (сек)
+LOG_DESCRIPTION_LIMIT = 4000  # максимум символов в description одного embed'а (лимит Discord — 4096)
+LOG_EMBEDS_PER_MESSAGE = 10  # лимит Discord на количество embed'ов в сообщении
+LOG_EMBEDS_MAX_CHARS = 6000  # лимит Discord на суммарный текст embed'ов в сообщении
+LOG_FIELD_LIMIT = 1024       # лимит Discord на значение поля embed'а
+LOG_LEVEL_COLORS = {
+    "debug": 0x95A5A6,
+    "info": 0x2ECC71,
+    "warning": 0xE67E22,
+    "error": 0xE74C3C,
+    "critical": 0xC0392B,
+}
+LOG_DEFAULT_COLOR = 0x95A5A6
+# Формат строк, которые DiscordChannelHandler отправляет в канал логов
+_LOG_FORMATTER = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
+
+
+def parse_log_level(value) -> Optional[int]:
+    """Числовой уровень logging по имени ("info", "WARNING", ...) или None, если имя неизвестно."""
+    level = logging.getLevelName(str(value or "").upper())
+    return level if isinstance(level, int) else None
+
+
+def allowed_log_levels() -> list:
+    """Уровни, которые имеет смысл задавать в log_level: всё ниже уровня root-логгера до обработчика не дойдёт."""
+    root_level = logging.getLogger().getEffectiveLevel()
+    return [name for name in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL") if logging.getLevelName(name) >= root_level]
+
+
+def _enqueue_log(embed: discord.Embed):
+    """Кладёт embed в _log_queue; безопасно вызывать из любого потока."""
+    bot.loop.call_soon_threadsafe(_log_queue.put_nowait, embed)
+
+
+def _chunk_lines(lines: list, limit: int) -> list:
+    """Склеивает строки через перевод строки в куски не длиннее `limit` символов."""
+    chunks = []
+    current = ""
+    for line in lines:
+        line = line[:limit]
+        if current and len(current) + 1 + len(line) > limit:
+            chunks.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _batch_embeds(embeds: list) -> list:
+    """Делит embed'ы на группы, укладывающиеся в лимиты одного сообщения."""
+    batches = []
+    current = []
+    size = 0
+    for embed in embeds:
+        n = len(embed)
+        if current and (len(current) >= LOG_EMBEDS_PER_MESSAGE or size + n > LOG_EMBEDS_MAX_CHARS):
+            batches.append(current)
+            current = []
+            size = 0
+        current.append(embed)
+        size += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _send_log_batch(embeds: list):
+    """Отправляет накопленные embed'ы в канал логов минимальным числом сообщений."""
+    ch = await fetch_log_channel()
+    if ch is None:
+        return
+    for group in _batch_embeds(embeds):
+        # Если Discord отклонит одну группу, остальные всё равно отправляем
+        try:
+            await ch.send(embeds=group)
+        except Exception:
+            pass
+
+
+async def _log_flusher():
+    while True:
+        batch = [await _log_queue.get()]
+        # Даём накопиться соседним записям и забираем всё, что есть
+        await asyncio.sleep(LOG_BATCH_WINDOW)
+        while not _log_queue.empty():
+            batch.append(_log_queue.get_nowait())
+        await _send_log_batch(batch)
+
+
 class DiscordChannelHandler(logging.Handler):
     """
-    Logging handler that sends formatted log records to a Discord channel.
-    The channel id is read via a callable so it can be changed at runtime
-    (reads from `settings`).
+    Logging handler that sends formatted log records to the `log_channel_id` channel
+    (resolved once per batch via the `_resolved` cache, so it can be changed at runtime
+    through /settings). Runs on the QueueListener thread (see on_ready):
+    records are only buffered here and flushed as embeds by `_flush_loop`
+    every `flush_interval` seconds, once `flush_size` records pile up,
+    or immediately for ERROR and above.
     """
-    def __init__(self, channel_id_getter):
+    def __init__(self, flush_interval: float = 2.0, flush_size: int = 20):
         super().__init__()
-        self._channel_id_getter = channel_id_getter
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._buf: list = []
+        self._wake = asyncio.Event()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_loop())
 
     def emit(self, record: logging.LogRecord) -> None:
         try:
             message = self.format(record)
-            channel_id = self._channel_id_getter()
-            if not channel_id:
-                return
-            try:
-                cid = int(channel_id)
-            except Exception:
-                return
-            bot.loop.create_task(self._send_to_channel(cid, f"[{record.levelname}] {message}"))
+            # handle() уже держит self.lock, так что с flush() мы не пересекаемся
+            self._buf.append(f"[{record.levelname}] {message}")
+            if record.levelno >= logging.ERROR or len(self._buf) >= self.flush_size:
+                self._wake_flush_loop()
         except Exception:
             self.handleError(record)
 
-    async def _send_to_channel(self, channel_id: int, message: str):
+    def _wake_flush_loop(self):
         try:
-            ch = bot.get_channel(channel_id)
-            if ch is None:
-                try:
-                    ch = await bot.fetch_channel(channel_id)
-                except Exception:
-                    return
-            await ch.send(message)
+            bot.loop.call_soon_threadsafe(self._wake.set)
+        except (AttributeError, RuntimeError):
+            # loop ещё не запущен или уже закрыт (QueueListener.stop() при выходе)
+            pass
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            lines, self._buf = self._buf, []
+        finally:
+            self.release()
+        if not lines:
+            return
+        try:
+            if setting_id("log_channel_id") is None:
+                return
+            for chunk in _chunk_lines(lines, LOG_DESCRIPTION_LIMIT):
+                _enqueue_log(discord.Embed(description=chunk, color=EMBED_COLOR))
         except Exception:
+            # loop уже закрыт (например, flush из logging.shutdown при выходе)
             pass
 
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            self.flush()
+
 
 def send_log(level: str, message: str):
     """Backward-compatible wrapper: отправляет простой embed-лог с описанием `message`."""
@@ -129,60 +398,69 @@ def send_log_embed(level: str = "info", title: Optional[str] = None, description
     Удобно вызывать с явными полями: moderator (User), owner_id (int), channel_id (int), reason (str).
     """
     try:
-        target = settings.get("log_channel_id")
-        if not target:
-            return
-        try:
-            target_id = int(target)
-        except Exception:
+        if setting_id("log_channel_id") is None:
             return
 
-        color_map = {
-            "debug": 0x95A5A6,
-            "info": 0x2ECC71,
-            "warning": 0xE67E22,
-            "error": 0xE74C3C,
-            "critical": 0xC0392B,
-        }
         lvl = (level or "info").lower()
-        embed_color = color_map.get(lvl, 0x95A5A6)
-        embed_title = title or (lvl.upper() if lvl else "LOG")
-        embed = discord.Embed(title=embed_title, description=description or "", color=embed_color)
         # Дополнительные поля
+        fields = []
         if moderator:
             try:
-                embed.add_field(name="Модератор", value=f"{getattr(moderator, 'mention', str(moderator))} (id={getattr(moderator, 'id', moderator)})", inline=True)
+                moderator_value = f"{getattr(moderator, 'mention', str(moderator))} (id={getattr(moderator, 'id', moderator)})"
             except Exception:
-                embed.add_field(name="Модератор", value=str(moderator), inline=True)
+                moderator_value = str(moderator)
+            fields.append({"name": "Модератор", "value": moderator_value[:LOG_FIELD_LIMIT], "inline": True})
         if owner_id:
-            embed.add_field(name="Владелец", value=f"<@{owner_id}> (id={owner_id})", inline=True)
+            fields.append({"name": "Владелец", "value": f"<@{owner_id}> (id={owner_id})", "inline": True})
         if channel_id:
-            embed.add_field(name="Канал", value=f"<#{channel_id}>", inline=True)
+            fields.append({"name": "Канал", "value": f"<#{channel_id}>", "inline": True})
         if reason:
-            embed.add_field(name="Причина", value=reason, inline=False)
-
-        async def _send_embed():
-            try:
-                ch = bot.get_channel(target_id)
-                if ch is None:
-                    try:
-                        ch = await bot.fetch_channel(target_id)
-                    except Exception:
-                        ch = None
-                if ch:
-                    await ch.send(embed=embed)
-            except Exception:
-                pass
-
-        try:
-            bot.loop.create_task(_send_embed())
-        except Exception:
-            # если loop недоступен — ничего не делаем
-            pass
+            fields.append({"name": "Причина", "value": reason[:LOG_FIELD_LIMIT], "inline": False})
+
+        # from_dict собирает embed за один проход, без вызова сеттеров на каждое поле
+        _enqueue_log(discord.Embed.from_dict({
+            "title": title or (lvl.upper() if lvl else "LOG"),
+            "description": (description or "")[:LOG_DESCRIPTION_LIMIT],
+            "color": LOG_LEVEL_COLORS.get(lvl, LOG_DEFAULT_COLOR),
+            "fields": fields,
+        }))
     except Exception:
         pass
 
+# ----------------- TICKET STATE -------------------
+@dataclass(slots=True)
+class TicketState:
+    """Данные открытого тикета. Хранятся в `_tickets` по ID канала тикета, view держат только этот ID."""
+    owner_id: int
+    nick: str
+    age: str
+    purpose: str
+    from_where: str
+    read_rules: str
+    taker_id: Optional[int] = None
+
+    def summary(self) -> str:
+        """Текст тикета для логов."""
+        return (
+            f"**Ник:** {self.nick}\n"
+            f"**Возраст:** {self.age}\n"
+            f"**Чем будет заниматься:** {self.purpose}\n"
+            f"**Откуда узнал:** {self.from_where}\n"
+            f"**Прочитал правила:** {self.read_rules}"
+        )
+
+
+# ID канала тикета -> TicketState (запись удаляется вместе с каналом, см. on_guild_channel_delete)
+_tickets: dict = {}
+
+
 # ----------------- MODALS -------------------
+# Шаблоны прав для канала тикета. discord.py только читает их при создании канала,
+# поэтому один экземпляр можно использовать для всех тикетов.
+_DENY_VIEW = discord.PermissionOverwrite(view_channel=False)
+_ALLOW_RW = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
+
+
 class TicketModal(discord.ui.Modal, title="Открыть тикет"):
     nick = discord.ui.TextInput(label="Ник в майнкрафте", min_length=3, max_length=50)
     age = discord.ui.TextInput(label="Возраст", min_length=1, max_length=2)
@@ -197,39 +475,34 @@ class TicketModal(discord.ui.Modal, title="Открыть тикет"):
     async def on_submit(self, interaction: discord.Interaction):
         guild = interaction.guild
         # server-side validation (safety)
-        nick_val = self.nick.value.strip() if hasattr(self.nick, "value") else str(self.nick).strip()
-        age_val = self.age.value.strip() if hasattr(self.age, "value") else str(self.age).strip()
-        purpose_val = self.purpose.value.strip() if hasattr(self.purpose, "value") else str(self.purpose).strip()
-        from_where_val = self.from_where.value.strip() if hasattr(self.from_where, "value") else str(self.from_where).strip()
-        read_rules_val = self.read_rules.value.strip() if hasattr(self.read_rules, "value") else str(self.read_rules).strip()
-
-        if not (3 <= len(nick_val) <= 50):
-            return await interaction.response.send_message("❌ Ник должен быть от 3 до 50 символов.", ephemeral=True)
-        if not (1 <= len(age_val) <= 2) or (not age_val.isdigit()):
-            return await interaction.response.send_message("❌ Возраст должен быть числом из 1-2 цифр.", ephemeral=True)
-        if not (50 <= len(purpose_val) <= 500):
-            return await interaction.response.send_message("❌ Поле 'Чем будете заниматься?' должно содержать от 50 до 500 символов.", ephemeral=True)
-        if not (1 <= len(from_where_val) <= 50):
-            return await interaction.response.send_message("❌ Поле 'Откуда узнали' должно содержать от 1 до 50 символов.", ephemeral=True)
-        if not (1 <= len(read_rules_val) <= 20):
-            return await interaction.response.send_message("❌ Поле 'Прочитали ли правила?' должно содержать от 1 до 20 символов.", ephemeral=True)
-
-        # Настройки
-        staff_role_id = settings.get("staff_role_id")
-        category_id = settings.get("ticket_category_id")
+        nick_val = self.nick.value.strip()
+        age_val = self.age.value.strip()
+        purpose_val = self.purpose.value.strip()
+        from_where_val = self.from_where.value.strip()
+        read_rules_val = self.read_rules.value.strip()
+
+        checks = (
+            (nick_val, 3, 50, False, "❌ Ник должен быть от 3 до 50 символов."),
+            (age_val, 1, 2, True, "❌ Возраст должен быть числом из 1-2 цифр."),
+            (purpose_val, 50, 500, False, "❌ Поле 'Чем будете заниматься?' должно содержать от 50 до 500 символов."),
+            (from_where_val, 1, 50, False, "❌ Поле 'Откуда узнали' должно содержать от 1 до 50 символов."),
+            (read_rules_val, 1, 20, False, "❌ Поле 'Прочитали ли правила?' должно содержать от 1 до 20 символов."),
+        )
+        for value, lo, hi, digits_only, error in checks:
+            if not (lo <= len(value) <= hi) or (digits_only and not value.isdigit()):
+                return await interaction.response.send_message(error, ephemeral=True)
 
         # Права: видит только владелец, стff и бот
         overwrites = {
-            guild.default_role: discord.PermissionOverwrite(view_channel=False),
-            self.author: discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True),
-            guild.me: discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
+            guild.default_role: _DENY_VIEW,
+            self.author: _ALLOW_RW,
+            guild.me: _ALLOW_RW
         }
-        if staff_role_id:
-            role = guild.get_role(int(staff_role_id))
-            if role:
-                overwrites[role] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True)
+        role = get_staff_role(guild)
+        if role:
+            overwrites[role] = _ALLOW_RW
 
-        category = guild.get_channel(int(category_id)) if category_id else None
+        category = get_category(guild)
 
         channel_name = f"ticket-{self.author.name}"[:90]
         channel = await guild.create_text_channel(name=channel_name, overwrites=overwrites, category=category, topic=f"ticket_owner:{self.author.id}")
@@ -246,7 +519,9 @@ class TicketModal(discord.ui.Modal, title="Открыть тикет"):
         embed.add_field(name="Информация", value=info_text, inline=False)
         embed.set_footer(text=f"Тикет от {self.author.display_name} | ID: {self.author.id}")
 
-        view = TicketInitialView(self.author, nick_val, age=age_val, purpose=purpose_val, from_where=from_where_val, read_rules=read_rules_val)
+        _tickets[channel.id] = TicketState(owner_id=self.author.id, nick=nick_val, age=age_val, purpose=purpose_val,
+                                           from_where=from_where_val, read_rules=read_rules_val)
+        view = TicketInitialView(channel.id)
         await channel.send(content=self.author.mention, embed=embed, view=view)
         await interaction.response.send_message(f"Тикет создан: {channel.mention}", ephemeral=True)
 
@@ -262,6 +537,7 @@ class GenericValueModal(discord.ui.Modal):
         self.add_item(self.value)
 
     async def on_submit(self, interaction: discord.Interaction):
+        global _settings_embed_cache
         key = self.option_key
         new_val = self.value.value
         # Попытка привести ID-поля к int
@@ -271,34 +547,138 @@ class GenericValueModal(discord.ui.Modal):
                 await interaction.response.send_message("❌ Значение должно быть числом (ID).", ephemeral=True)
                 return
             settings[key] = conv
+            _resolved.pop(key, None)
+        elif key == "log_level":
+            level = parse_log_level(new_val)
+            allowed = allowed_log_levels()
+            if level is None or logging.getLevelName(level) not in allowed:
+                await interaction.response.send_message(f"❌ Уровень логов: {', '.join(allowed)}.", ephemeral=True)
+                return
+            settings[key] = logging.getLevelName(level)
+            # Меняем уровень уже установленного обработчика, пересоздавать его не нужно
+            handler = getattr(bot, "log_handler", None)
+            if handler is not None:
+                handler.setLevel(level)
         else:
             settings[key] = new_val
         save_settings(settings)
+        _settings_embed_cache = None
         await interaction.response.send_message(f"✅ Настройка **{key}** обновлена.", ephemeral=True)
 
 
+class RejectReasonModal(discord.ui.Modal, title="Причина отказа"):
+    reason = discord.ui.TextInput(label="Причина (опционально)", style=discord.TextStyle.long, required=False)
+
+    def __init__(self, channel_id: int):
+        super().__init__()
+        self.channel_id = channel_id
+
+    async def on_submit(self, modal_interaction: discord.Interaction):
+        state = _tickets.get(self.channel_id)
+        owner_member = modal_interaction.guild.get_member(state.owner_id) if state else None
+        msg = settings.get("reject_message", "Ваш тикет был отклонён.")
+        if self.reason.value:
+            msg = f"{msg}\n\n**Причина:** {self.reason.value}"
+        try:
+            if owner_member:
+                # отправляем отклонение в embed
+                description = msg + "\n\n-# С уважением команда Abyss"
+                embed = discord.Embed(title="Ваша заявка отклонена!", description=description, color=EMBED_COLOR)
+                await owner_member.send(embed=embed)
+        except Exception:
+            pass
+        await modal_interaction.response.send_message("❌ Тикет отклонён. Игрок уведомлён (если возможно).", ephemeral=True)
+
+        # Логируем отклонение тикета
+        try:
+            taker = modal_interaction.user
+            owner_id = state.owner_id if state else None
+            ch_id = modal_interaction.channel.id if modal_interaction.channel else None
+            reason_text = self.reason.value or ""
+            ticket_text = state.summary() if state else None
+
+            send_log_embed(level="warning",
+                           title="Заявка отклонена",
+                           description=f"Тикет отклонён модератором {taker} (id={taker.id})\n\n{ticket_text or ''}",
+                           moderator=taker,
+                           owner_id=owner_id,
+                           channel_id=ch_id,
+                           reason=reason_text)
+            # Удаляем канал тикета сразу после отклонения
+            try:
+                if modal_interaction.channel:
+                    await modal_interaction.channel.delete()
+            except Exception:
+                pass
+        except Exception:
+            pass
+
+
+class AddModeratorModal(discord.ui.Modal, title="Добавить модератора в тикет"):
+    moderator = discord.ui.TextInput(label="ID или упоминание модератора", style=discord.TextStyle.short, required=True, max_length=100)
+
+    async def on_submit(self, modal_interaction: discord.Interaction):
+        raw = self.moderator.value.strip()
+        # извлекаем первое числовое вхождение (ID)
+        m = _SNOWFLAKE_RE.search(raw)
+        if not m:
+            await modal_interaction.response.send_message("❌ Не удалось распознать ID пользователя.", ephemeral=True)
+            return
+        try:
+            mid = int(m.group(0))
+        except Exception:
+            await modal_interaction.response.send_message("❌ Неверный ID.", ephemeral=True)
+            return
+
+        guild = modal_interaction.guild
+        member = guild.get_member(mid)
+        if member is None:
+            try:
+                member = await guild.fetch_member(mid)
+            except Exception:
+                member = None
+        if member is None:
+            await modal_interaction.response.send_message("❌ Пользователь не найден на сервере.", ephemeral=True)
+            return
+
+        ch = modal_interaction.channel
+        try:
+            # Разрешаем выбранному модератору писать в канале
+            await ch.set_permissions(member, send_messages=True, view_channel=True, read_message_history=True)
+            # Отправляем сообщение в канал с упоминанием
+            await ch.send(f"{member.mention} Вы были добавлены в тикет {ch.mention}")
+            await modal_interaction.response.send_message("✔ Модератор добавлен в тикет.", ephemeral=True)
+            # Логируем добавление модератора
+            try:
+                send_log_embed(level="info",
+                               title="Модератор добавлен в тикет",
+                               description=f"Пользователь {member.mention} добавлен в тикет пользователем {modal_interaction.user} (id={modal_interaction.user.id})",
+                               moderator=member,
+                               channel_id=ch.id)
+            except Exception:
+                pass
+        except Exception:
+            await modal_interaction.response.send_message("❌ Не удалось установить права или отправить сообщение.", ephemeral=True)
+
+
 # ----------------- VIEWS / BUTTONS -----------------
 class TicketInitialView(discord.ui.View):
-    def __init__(self, owner: discord.Member, nick_text: str, age: Optional[str] = None,
-                 purpose: Optional[str] = None, from_where: Optional[str] = None, read_rules: Optional[str] = None):
+    def __init__(self, channel_id: int):
         super().__init__(timeout=None)
-        self.owner = owner
-        self.nick_text = nick_text
-        self.age = age
-        self.purpose = purpose
-        self.from_where = from_where
-        self.read_rules = read_rules
-        self.taken_by: Optional[int] = None
+        self.channel_id = channel_id
 
     @discord.ui.button(label="Принять тикет", style=discord.ButtonStyle.primary, custom_id="ticket:take")
     async def take_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        state = _tickets.get(self.channel_id)
+        if state is None:
+            return await interaction.response.send_message("❌ Данные тикета не найдены.", ephemeral=True)
+
         # Проверка роли
-        staff_role_id = settings.get("staff_role_id")
-        if staff_role_id is None:
+        if setting_id("staff_role_id") is None:
             return await interaction.response.send_message("❌ Роль модераторов не настроена.", ephemeral=True)
 
         allowed = False
-        role = interaction.guild.get_role(int(staff_role_id))
+        role = get_staff_role(interaction.guild)
         if role and role in interaction.user.roles:
             allowed = True
         if interaction.user.guild_permissions.administrator:
@@ -306,77 +686,57 @@ class TicketInitialView(discord.ui.View):
         if not allowed:
             return await interaction.response.send_message("❌ У вас нет прав принять тикет.", ephemeral=True)
 
-        if self.taken_by is not None:
+        if state.taker_id is not None:
             return await interaction.response.send_message("⚠ Этот тикет уже занят.", ephemeral=True)
 
-        self.taken_by = interaction.user.id
+        state.taker_id = interaction.user.id
         # Ограничиваем возможность писать для других модераторов: запрещаем send_messages для роли staff
-        try:
-            ch = interaction.channel
-            if ch:
-                if staff_role_id:
-                    role = interaction.guild.get_role(int(staff_role_id))
-                    if role:
-                        # запретим отправку сообщений для роли модераторов
-                        await ch.set_permissions(role, send_messages=False, view_channel=True, read_message_history=True)
-                # явно разрешим отправку сообщений для модера, который взял тикет
-                await ch.set_permissions(interaction.user, send_messages=True, view_channel=True, read_message_history=True)
-                # убедимся, что владелец тикета по-прежнему может писать
-                owner_member = interaction.guild.get_member(self.owner.id)
-                if owner_member:
-                    await ch.set_permissions(owner_member, send_messages=True, view_channel=True, read_message_history=True)
-        except Exception:
-            pass
-        # Редактируем сообщение, показываем новую view (передаём данные тикета)
-        await interaction.response.edit_message(view=TicketTakenView(
-            self.owner,
-            self.nick_text,
-            self.taken_by,
-            age=self.age,
-            purpose=self.purpose,
-            from_where=self.from_where,
-            read_rules=self.read_rules
-        ))
+        # Права независимы друг от друга, поэтому выставляем их параллельно
+        ch = interaction.channel
+        if ch:
+            tasks = []
+            if role:
+                # запретим отправку сообщений для роли модераторов
+                tasks.append(ch.set_permissions(role, send_messages=False, view_channel=True, read_message_history=True))
+            # явно разрешим отправку сообщений для модера, который взял тикет
+            tasks.append(ch.set_permissions(interaction.user, send_messages=True, view_channel=True, read_message_history=True))
+            # владельцу права на запись выданы при создании канала (TicketModal), их не трогаем
+            await asyncio.gather(*tasks, return_exceptions=True)
+        # Редактируем сообщение, показываем новую view (данные тикета остаются в _tickets)
+        await interaction.response.edit_message(view=TicketTakenView(self.channel_id))
 
 
 class TicketTakenView(discord.ui.View):
-    def __init__(self, owner: discord.Member, nick_text: str, taker_id: int,
-                 age: Optional[str] = None, purpose: Optional[str] = None,
-                 from_where: Optional[str] = None, read_rules: Optional[str] = None):
+    def __init__(self, channel_id: int):
         super().__init__(timeout=None)
-        self.owner = owner
-        self.nick_text = nick_text
-        self.taker_id = taker_id
-        self.age = age
-        self.purpose = purpose
-        self.from_where = from_where
-        self.read_rules = read_rules
+        self.channel_id = channel_id
 
     def _is_taker_or_admin(self, interaction: discord.Interaction) -> bool:
-        return interaction.user.id == self.taker_id or interaction.user.guild_permissions.administrator
+        state = _tickets.get(self.channel_id)
+        taker_id = state.taker_id if state else None
+        return interaction.user.id == taker_id or interaction.user.guild_permissions.administrator
 
     @discord.ui.button(label="Принять окончательно", style=discord.ButtonStyle.success, custom_id="ticket:accept_final")
     async def accept_final(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not self._is_taker_or_admin(interaction):
             return await interaction.response.send_message("⚠ Только модератор, взявший тикет, может это сделать.", ephemeral=True)
 
+        state = _tickets.get(self.channel_id)
         guild = interaction.guild
-        member = guild.get_member(self.owner.id)
+        member = guild.get_member(state.owner_id) if state else None
         if member:
             # Сменить ник
             try:
-                await member.edit(nick=self.nick_text)
+                await member.edit(nick=state.nick)
             except Exception:
                 pass
             # Выдать роль
-            accepted_role_id = settings.get("accepted_role_id")
-            if accepted_role_id:
-                role = guild.get_role(int(accepted_role_id))
-                if role:
-                    try:
-                        await member.add_roles(role, reason="Тикет принят")
-                    except Exception:
-                        pass
+            role = get_accepted_role(guild)
+            if role:
+                try:
+                    await member.add_roles(role, reason="Тикет принят")
+                except Exception:
+                    pass
             # Отправить ЛС в виде embed'а
             try:
                 accept_text = settings.get("accept_message", None)
@@ -394,20 +754,11 @@ class TicketTakenView(discord.ui.View):
         try:
             chan = interaction.channel
             taker = interaction.user
-            owner_id = self.owner.id
+            owner_id = state.owner_id if state else None
             channel_id = chan.id if chan else None
             # structured embed log
             # Соберём текст тикета для логов
-            try:
-                ticket_text = (
-                    f"**Ник:** {getattr(self, 'nick_text', '')}\n"
-                    f"**Возраст:** {getattr(self, 'age', '')}\n"
-                    f"**Чем будет заниматься:** {getattr(self, 'purpose', '')}\n"
-                    f"**Откуда узнал:** {getattr(self, 'from_where', '')}\n"
-                    f"**Прочитал правила:** {getattr(self, 'read_rules', '')}"
-                )
-            except Exception:
-                ticket_text = None
+            ticket_text = state.summary() if state else None
 
             send_log_embed(level="info",
                            title="Заявка принята",
@@ -428,60 +779,7 @@ class TicketTakenView(discord.ui.View):
     async def reject_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not self._is_taker_or_admin(interaction):
             return await interaction.response.send_message("⚠ Только модератор, взявший тикет, может отклонить.", ephemeral=True)
-
-        owner_member = interaction.guild.get_member(self.owner.id)
-
-        class RejectReasonModal(discord.ui.Modal, title="Причина отказа"):
-            reason = discord.ui.TextInput(label="Причина (опционально)", style=discord.TextStyle.long, required=False)
-
-            async def on_submit(inner_self, modal_interaction: discord.Interaction):
-                msg = settings.get("reject_message", "Ваш тикет был отклонён.")
-                if inner_self.reason.value:
-                    msg = f"{msg}\n\n**Причина:** {inner_self.reason.value}"
-                try:
-                    if owner_member:
-                        # отправляем отклонение в embed
-                        description = msg + "\n\n-# С уважением команда Abyss"
-                        embed = discord.Embed(title="Ваша заявка отклонена!", description=description, color=EMBED_COLOR)
-                        await owner_member.send(embed=embed)
-                except Exception:
-                    pass
-                await modal_interaction.response.send_message("❌ Тикет отклонён. Игрок уведомлён (если возможно).", ephemeral=True)
-
-                # Логируем отклонение тикета
-                try:
-                    taker = modal_interaction.user
-                    owner_id = self.owner.id
-                    ch_id = modal_interaction.channel.id if modal_interaction.channel else None
-                    reason_text = inner_self.reason.value or ""
-                    try:
-                        ticket_text = (
-                            f"**Ник:** {getattr(self, 'nick_text', '')}\n"
-                            f"**Возраст:** {getattr(self, 'age', '')}\n"
-                            f"**Чем будет заниматься:** {getattr(self, 'purpose', '')}\n"
-                            f"**Откуда узнал:** {getattr(self, 'from_where', '')}\n"
-                            f"**Прочитал правила:** {getattr(self, 'read_rules', '')}"
-                        )
-                    except Exception:
-                        ticket_text = None
-
-                    send_log_embed(level="warning",
-                                   title="Заявка отклонена",
-                                   description=f"Тикет отклонён модератором {taker} (id={taker.id})\n\n{ticket_text or ''}",
-                                   moderator=taker,
-                                   owner_id=owner_id,
-                                   channel_id=ch_id,
-                                   reason=reason_text)
-                    # Удаляем канал тикета сразу после отклонения
-                    try:
-                        if modal_interaction.channel:
-                            await modal_interaction.channel.delete()
-                    except Exception:
-                        pass
-                except Exception:
-                    pass
-
-        await interaction.response.send_modal(RejectReasonModal())
+        await interaction.response.send_modal(RejectReasonModal(self.channel_id))
 
     @discord.ui.button(label="Удалить тикет", style=discord.ButtonStyle.secondary, custom_id="ticket:delete")
     async def delete_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -497,58 +795,14 @@ class TicketTakenView(discord.ui.View):
     async def add_moderator(self, interaction: discord.Interaction, button: discord.ui.Button):
         if not self._is_taker_or_admin(interaction):
             return await interaction.response.send_message("⚠ Только модератор, взявший тикет, может это сделать.", ephemeral=True)
-
-        class AddModeratorModal(discord.ui.Modal, title="Добавить модератора в тикет"):
-            moderator = discord.ui.TextInput(label="ID или упоминание модератора", style=discord.TextStyle.short, required=True, max_length=100)
-
-            async def on_submit(inner_self, modal_interaction: discord.Interaction):
-                raw = inner_self.moderator.value.strip()
-                # извлекаем первое числовое вхождение (ID)
-                import re
-                m = re.search(r"\d{17,20}", raw)
-                if not m:
-                    await modal_interaction.response.send_message("❌ Не удалось распознать ID пользователя.", ephemeral=True)
-                    return
-                try:
-                    mid = int(m.group(0))
-                except Exception:
-                    await modal_interaction.response.send_message("❌ Неверный ID.", ephemeral=True)
-                    return
-
-                guild = modal_interaction.guild
-                member = guild.get_member(mid)
-                if member is None:
-                    try:
-                        member = await guild.fetch_member(mid)
-                    except Exception:
-                        member = None
-                if member is None:
-                    await modal_interaction.response.send_message("❌ Пользователь не найден на сервере.", ephemeral=True)
-                    return
-
-                ch = modal_interaction.channel
-                try:
-                    # Разрешаем выбранному модератору писать в канале
-                    await ch.set_permissions(member, send_messages=True, view_channel=True, read_message_history=True)
-                    # Отправляем сообщение в канал с упоминанием
-                    await ch.send(f"{member.mention} Вы были добавлены в тикет {ch.mention}")
-                    await modal_interaction.response.send_message("✔ Модератор добавлен в тикет.", ephemeral=True)
-                    # Логируем добавление модератора
-                    try:
-                        send_log_embed(level="info",
-                                       title="Модератор добавлен в тикет",
-                                       description=f"Пользователь {member.mention} добавлен в тикет пользователем {modal_interaction.user} (id={modal_interaction.user.id})",
-                                       moderator=member,
-                                       channel_id=ch.id)
-                    except Exception:
-                        pass
-                except Exception:
-                    await modal_interaction.response.send_message("❌ Не удалось установить права или отправить сообщение.", ephemeral=True)
-
         await interaction.response.send_modal(AddModeratorModal())
 
 
 # ----------------- Open Ticket View -----------------
+# Неизменная часть embed'а с кнопкой; текст подставляется из настроек при развёртывании
+_TICKET_EMBED_BASE = {"title": "Открыть тикет", "color": EMBED_COLOR}
+
+
 class OpenTicketView(discord.ui.View):
     def __init__(self):
         super().__init__(timeout=None)
@@ -570,6 +824,7 @@ class SettingsSelect(discord.ui.Select):
             discord.SelectOption(label="Роль при принятии (ID)", value="accepted_role_id", description="ID роли, выдаваемой при принятии"),
             discord.SelectOption(label="Текст при принятии", value="accept_message", description="Текст, отправляемый в ЛС при принятии"),
             discord.SelectOption(label="Текст при отказе", value="reject_message", description="Текст, отправляемый в ЛС при отказе"),
+            discord.SelectOption(label="Уровень логов", value="log_level", description="INFO, WARNING, ERROR или CRITICAL"),
         ]
         super().__init__(placeholder="Выберите настройку для редактирования...", min_values=1, max_values=1, options=options)
 
@@ -586,12 +841,11 @@ class SettingsView(discord.ui.View):
         self.add_item(SettingsSelect())
 
 # ----------------- SLASH COMMANDS -----------------
-@bot.tree.command(name="settings", description="Настройки тикет-системы (админы)")
-@app_commands.checks.has_permissions(administrator=True)
-async def settings_command(interaction: discord.Interaction):
-    """Открывает select-menu для изменения настроек (вариант A)."""
-    view = SettingsView()
-    # Показываем текущее значение в embed
+# Embed с текущими настройками; собирается заново только после изменения настроек
+_settings_embed_cache: Optional[discord.Embed] = None
+
+
+def _build_settings_embed() -> discord.Embed:
     embed = discord.Embed(title="Настройки тикетов", color=EMBED_COLOR)
     def fmt(k):
         v = settings.get(k)
@@ -604,68 +858,258 @@ async def settings_command(interaction: discord.Interaction):
     embed.add_field(name="Роль при принятии (ID)", value=fmt("accepted_role_id"), inline=True)
     embed.add_field(name="Текст при принятии", value=fmt("accept_message"), inline=False)
     embed.add_field(name="Текст при отказе", value=fmt("reject_message"), inline=False)
+    embed.add_field(name="Уровень логов", value=fmt("log_level"), inline=True)
+    return embed
 
-    await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+
+@bot.tree.command(name="settings", description="Настройки тикет-системы (админы)")
+@app_commands.checks.has_permissions(administrator=True)
+async def settings_command(interaction: discord.Interaction):
+    """Открывает select-menu для изменения настроек (вариант A)."""
+    global _settings_embed_cache
+    # Показываем текущее значение в embed
+    if _settings_embed_cache is None:
+        _settings_embed_cache = _build_settings_embed()
+    await interaction.response.send_message(embed=_settings_embed_cache, view=SettingsView(), ephemeral=True)
 
 
 @bot.tree.command(name="deploy_ticket_message", description="Развернуть сообщение с кнопкой для открытия тикета (админ)")
 @app_commands.checks.has_permissions(administrator=True)
 async def deploy_ticket_message(interaction: discord.Interaction):
+    # Сразу подтверждаем interaction: дальше идут запросы к API, которые могут не уложиться в 3 с
+    await interaction.response.defer(ephemeral=True)
     ch_id = settings.get("ticket_button_channel_id")
     if not ch_id:
-        return await interaction.response.send_message("❌ Канал для сообщения не настроен (ticket_button_channel_id).", ephemeral=True)
+        return await interaction.followup.send("❌ Канал для сообщения не настроен (ticket_button_channel_id).", ephemeral=True)
     channel = interaction.guild.get_channel(int(ch_id))
     if channel is None:
-        return await interaction.response.send_message("❌ Канал не найден.", ephemeral=True)
-    embed = discord.Embed(title="Открыть тикет", description=settings.get("ticket_message_text", "Открыть тикет"), color=EMBED_COLOR)
-    await channel.send(embed=embed, view=OpenTicketView())
-    await interaction.response.send_message(f"✔ Сообщение с кнопкой отправлено в {channel.mention}.", ephemeral=True)
+        return await interaction.followup.send("❌ Канал не найден.", ephemeral=True)
+    embed = discord.Embed.from_dict({**_TICKET_EMBED_BASE, "description": settings.get("ticket_message_text", "Открыть тикет")})
+    # Если сообщение уже развёрнуто в этом канале — обновляем его, а не отправляем новое
+    message_id = settings.get("ticket_message_id")
+    if message_id:
+        try:
+            message = await channel.fetch_message(int(message_id))
+        except discord.HTTPException:
+            # Сообщение удалено или его нельзя прочитать (например, нет Read Message History) — отправим новое
+            message = None
+        if message is not None:
+            await message.edit(embed=embed, view=bot.ticket_view)
+            return await interaction.followup.send(f"✔ Сообщение с кнопкой обновлено в {channel.mention}.", ephemeral=True)
+    message = await channel.send(embed=embed, view=bot.ticket_view)
+    settings["ticket_message_id"] = message.id
+    save_settings(settings)
+    await interaction.followup.send(f"✔ Сообщение с кнопкой отправлено в {channel.mention}.", ephemeral=True)
 
 
 @bot.tree.command(name="test_log", description="Отправить тестовый лог в канал логов (админ)")
 @app_commands.checks.has_permissions(administrator=True)
 async def test_log(interaction: discord.Interaction):
     """Команда для тестирования отправки логов."""
+    await interaction.response.defer(ephemeral=True)
     send_log_embed(level="debug", title="Тестовый лог", description=f"Test log from {interaction.user} (id={interaction.user.id})", moderator=interaction.user)
-    await interaction.response.send_message("✔ Тестовый лог отправлен (если настроен канал).", ephemeral=True)
+    await interaction.followup.send("✔ Тестовый лог отправлен (если настроен канал).", ephemeral=True)
 
 
 # ----------------- ERROR HANDLERS -----------------
+# Что показать пользователю по типу ошибки; сам текст ошибки уходит только в лог
+_ERROR_MESSAGES = {
+    app_commands.MissingPermissions: "❌ Недостаточно прав.",
+    app_commands.BotMissingPermissions: "❌ У бота недостаточно прав для этой команды.",
+    app_commands.CommandOnCooldown: "⏳ Слишком часто.",
+    app_commands.CheckFailure: "❌ Команда недоступна.",
+}
+_DEFAULT_ERROR_MESSAGE = "❌ Ошибка выполнения команды."
+
+
+async def _handle_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    # Ищем по MRO, чтобы подклассы (например, разные CheckFailure) тоже находили свой текст
+    message = next((_ERROR_MESSAGES[cls] for cls in type(error).__mro__ if cls in _ERROR_MESSAGES), _DEFAULT_ERROR_MESSAGE)
+    command = interaction.command.name if interaction.command else "?"
+    if isinstance(error, app_commands.CheckFailure):
+        logger.info("/%s отклонена для %s (id=%s): %s", command, interaction.user, interaction.user.id, error)
+    else:
+        logger.error("Ошибка в /%s", command, exc_info=error)
+    await send_ephemeral(interaction, message)
+
+
 @settings_command.error
 async def settings_error(interaction: discord.Interaction, error):
-    await interaction.response.send_message(f"Ошибка: {error}", ephemeral=True)
+    await _handle_command_error(interaction, error)
 
 @deploy_ticket_message.error
 async def deploy_error(interaction: discord.Interaction, error):
-    await interaction.response.send_message(f"Ошибка: {error}", ephemeral=True)
+    await _handle_command_error(interaction, error)
 
 # ----------------- STARTUP -----------------
-@bot.event
-async def on_ready():
-    # если нужно — можно зарегистрировать persistent views здесь: bot.add_view(...)
+# Команды синхронизируются с Discord только если их набор изменился с прошлой
+# синхронизации (хэш хранится в settings["_cmd_hash"]) или задан FORCE_SYNC.
+# После успешной проверки повторные on_ready (переподключения) её пропускают.
+_synced = asyncio.Event()
+# Синхронизация идёт фоновой задачей: discord.py сам ждёт Retry-After внутри tree.sync(),
+# и on_ready не должен ждать вместе с ним. Ссылки на задачу и отложенный повтор
+# храним здесь (задачу без ссылки может собрать GC).
+_sync_task: Optional[asyncio.Task] = None
+_sync_retry_handle: Optional[asyncio.TimerHandle] = None
+
+
+def _commands_hash() -> str:
+    payload = sorted((cmd.to_dict(bot.tree) for cmd in bot.tree.get_commands()), key=lambda d: d["name"])
+    return hashlib.sha1(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def _start_sync():
+    """Запускает _sync_commands, если синхронизация ещё не сделана, не идёт и повтор не запланирован."""
+    global _sync_task
+    if _synced.is_set() or _sync_retry_handle is not None:
+        return
+    if _sync_task is not None and not _sync_task.done():
+        return
+    _sync_task = bot.loop.create_task(_sync_commands())
+
+
+def _schedule_sync_retry(retry_after: float):
+    global _sync_retry_handle
+    if _sync_retry_handle is not None:
+        return
+    logger.warning("tree.sync: rate limit, повторная синхронизация через %.1f с", retry_after)
+    _sync_retry_handle = bot.loop.call_later(retry_after, _run_sync_retry)
+
+
+def _run_sync_retry():
+    global _sync_retry_handle
+    _sync_retry_handle = None
+    _start_sync()
+
+
+async def _sync_commands():
     try:
-        await bot.tree.sync()
+        cmd_hash = _commands_hash()
+        if os.getenv("FORCE_SYNC") or cmd_hash != settings.get("_cmd_hash"):
+            await bot.tree.sync()
+            settings["_cmd_hash"] = cmd_hash
+            save_settings(settings)
+        _synced.set()
+    except discord.RateLimited as e:
+        # Ожидание дольше max_ratelimit_timeout — повторим позже
+        _schedule_sync_retry(e.retry_after)
+    except discord.HTTPException as e:
+        if e.status == 429:
+            _schedule_sync_retry(float(e.response.headers.get("Retry-After", 5)))
+        else:
+            logger.warning("tree.sync не удался: %s", e)
     except Exception:
-        pass
+        # Например, MissingApplicationID или ошибка при сборке хэша — бот всё равно работает
+        logger.exception("Не удалось синхронизировать команды")
+
+
+@bot.event
+async def on_disconnect():
+    # Отправляем накопленные логи, не дожидаясь следующего интервала
+    handler = getattr(bot, "log_handler", None)
+    if handler is not None:
+        handler.flush()
+
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    # Канал тикета удалён (кнопками или вручную) — его данные больше не нужны
+    _tickets.pop(channel.id, None)
+    # Удалённые категорию/канал логов нельзя отдавать из кэша
+    forget_resolved(channel.id, "ticket_category_id", "log_channel_id")
+
+
+@bot.event
+async def on_guild_role_delete(role):
+    forget_resolved(role.id, "staff_role_id", "accepted_role_id")
+
+
+@bot.event
+async def on_ready():
+    global _settings_writer_task, _log_flusher_task
+    if _settings_writer_task is None:
+        _settings_writer_task = bot.loop.create_task(_settings_writer())
+    if _log_flusher_task is None:
+        _log_flusher_task = bot.loop.create_task(_log_flusher())
+    # Persistent view: кнопка "Открыть тикет" продолжает работать после перезапуска.
+    # Один экземпляр на процесс, его же использует /deploy_ticket_message
+    if getattr(bot, "ticket_view", None) is None:
+        bot.ticket_view = OpenTicketView()
+        bot.add_view(bot.ticket_view)
+    _start_sync()
     # Настроим отправку логов в канал, если указан `log_channel_id` в settings
     try:
         log_channel_id = settings.get("log_channel_id")
-        if log_channel_id:
-            handler = DiscordChannelHandler(lambda: settings.get("log_channel_id"))
-            handler.setLevel(logging.INFO)
-            formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
-            handler.setFormatter(formatter)
+        # on_ready срабатывает на каждом переподключении — обработчик ставим только один раз
+        if log_channel_id and getattr(bot, "log_handler", None) is None:
+            # Нужны только при включённых логах в канал
+            import queue
+            from logging.handlers import QueueHandler, QueueListener
+
+            handler = DiscordChannelHandler()
+            level = parse_log_level(settings.get("log_level"))
+            handler.setLevel(level if level is not None else logging.INFO)
+            handler.setFormatter(_LOG_FORMATTER)
+            # Вызов логгера только кладёт запись в очередь, а форматирование и отправку
+            # выполняет отдельный поток QueueListener
+            record_queue = queue.Queue(-1)
             root_logger = logging.getLogger()
-            root_logger.addHandler(handler)
+            root_logger.addHandler(QueueHandler(record_queue))
+            bot.log_listener = QueueListener(record_queue, handler, respect_handler_level=True)
+            bot.log_listener.start()
+            bot.log_handler = handler
+            handler.start(bot.loop)
             if root_logger.level == logging.NOTSET:
                 root_logger.setLevel(logging.INFO)
-    except Exception:
-        pass
-    print(f"Bot ready: {bot.user} (ID: {bot.user.id})")
+    except (OSError, ValueError) as e:
+        # Без логов в канал бот всё равно должен запуститься
+        logger.warning("Не удалось настроить логирование в канал: %r", e)
+    logger.info("Bot ready: %s (ID: %s)", bot.user, bot.user.id)
+
+
+async def _flush_logs_on_shutdown():
+    """Отправляет всё, что осталось в буфере обработчика и в _log_queue. Вызывается до закрытия HTTP-сессии."""
+    listener = getattr(bot, "log_listener", None)
+    if listener is not None:
+        # stop() дожидается, пока поток QueueListener передаст обработчику все записи
+        await asyncio.to_thread(listener.stop)
+        bot.log_listener = None
+    handler = getattr(bot, "log_handler", None)
+    if handler is not None:
+        handler.flush()
+    # flush() кладёт embed'ы через call_soon_threadsafe — даём этим колбэкам выполниться
+    await asyncio.sleep(0)
+    batch = []
+    while not _log_queue.empty():
+        batch.append(_log_queue.get_nowait())
+    if batch:
+        await _send_log_batch(batch)
+
+
+async def main():
+    # Свой connector вместо стандартного: переиспользуем TLS-соединения к API дольше
+    # и кэшируем DNS. Должен быть задан до login(), где создаётся HTTP-сессия.
+    # limit=0 — как у discord.py по умолчанию, без ограничения числа одновременных запросов
+    bot.http.connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300, keepalive_timeout=60)
+    async with bot:
+        try:
+            await bot.start(TOKEN)
+        finally:
+            # Сессия ещё открыта: close() вызовет только выход из `async with bot`
+            await _flush_logs_on_shutdown()
 
 
 if __name__ == "__main__":
+    # Логи discord.py и самого бота — в stderr (как у bot.run(), но для root-логгера)
+    discord.utils.setup_logging()
     if TOKEN == "REPLACE_WITH_YOUR_TOKEN":
-        print("Пожалуйста, укажи токен в переменной TOKEN в файле перед запуском.")
+        logger.error("Пожалуйста, укажи токен в переменной TOKEN в файле перед запуском.")
     else:
-        bot.run(TOKEN)
+        if uvloop is not None:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
+        # Loop уже остановлен: сохраняем синхронно, чтобы не потерять отложенные изменения
+        save_settings(settings)